@@ -0,0 +1,197 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+LEDGER_VIEW_COLUMNS = ['Date', 'Type', 'Sr', 'Name', 'Amount', 'Balance']
+
+
+def _parse_amount(amount):
+    value = pd.to_numeric(amount, errors='coerce')
+    return 0.0 if pd.isna(value) else float(value)
+
+def _parse_date(entry_date):
+    value = pd.to_datetime(entry_date, errors='coerce')
+    return None if pd.isna(value) else np.datetime64(value.date(), 'D')
+
+
+class RunningBalance:
+    """Income and expenses merged in date order with a cached cumulative balance
+
+    Entries live in date-sorted numpy arrays alongside their running balance, so
+    "balance as of date D" is a binary search. An engine is never changed once
+    built; ``extended``, ``replaced`` and ``removed`` copy the arrays and only
+    recompute the balances after the position of the changed entry. Entries without a valid date count towards
+    the totals but not the timeline.
+    """
+
+    def __init__(self, income_data, expense_data):
+        self.total_income = 0.0
+        self.total_expenses = 0.0
+        self._size = 0
+        self._dates = np.empty(0, dtype='datetime64[D]')
+        self._amounts = np.empty(0, dtype=np.float64)
+        self._balances = np.empty(0, dtype=np.float64)
+        self._details = []
+        self._view = None
+
+        frames = []
+        for data, entry_type, sign in [(income_data, 'Income', 1.0), (expense_data, 'Expense', -1.0)]:
+            amounts = pd.to_numeric(data['Amount'], errors='coerce').fillna(0).astype(np.float64)
+            if entry_type == 'Income':
+                self.total_income = float(amounts.sum())
+            else:
+                self.total_expenses = float(amounts.sum())
+            frames.append(pd.DataFrame({
+                'Date': pd.to_datetime(data['Date'], errors='coerce'),
+                'Type': entry_type,
+                'Sr': data['Sr'].astype(str),
+                'Name': data['Name'].astype(str),
+                'Signed': amounts * sign
+            }))
+
+        merged = pd.concat(frames, ignore_index=True).dropna(subset=['Date'])
+        # Stable sort keeps sheet order for entries on the same day, income before expenses
+        merged = merged.sort_values('Date', kind='stable')
+
+        self._size = len(merged)
+        self._dates = merged['Date'].to_numpy(dtype='datetime64[D]')
+        self._amounts = merged['Signed'].to_numpy(dtype=np.float64)
+        self._balances = np.cumsum(self._amounts)
+        self._details = list(zip(merged['Type'], merged['Sr'], merged['Name']))
+
+    @property
+    def net_balance(self):
+        return self.total_income - self.total_expenses
+
+    def __len__(self):
+        return self._size
+
+    def balance_as_of(self, as_of):
+        """Balance after every dated entry on or before as_of"""
+        position = np.searchsorted(self._dates[:self._size], np.datetime64(pd.Timestamp(as_of).date(), 'D'), side='right')
+        return float(self._balances[position - 1]) if position else 0.0
+
+    def _grow(self):
+        capacity = max(16, len(self._dates) * 2)
+        for name in ['_dates', '_amounts', '_balances']:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _copy(self):
+        engine = copy.copy(self)
+        engine._dates = self._dates.copy()
+        engine._amounts = self._amounts.copy()
+        engine._balances = self._balances.copy()
+        engine._details = list(self._details)
+        engine._view = None
+        return engine
+
+    def extended(self, sheet_name, rows):
+        """Return a new engine with [Sr, Date, Name, Amount] rows from sheet_name added
+
+        The engine itself is never changed, so sessions still reading it are safe.
+        """
+        engine = self._copy()
+        for row in rows:
+            engine._add_entry(sheet_name, row)
+        return engine
+
+    def replaced(self, sheet_name, position, old_row, new_row):
+        """Return a new engine with old_row of sheet_name swapped for new_row
+
+        Raises KeyError if old_row isn't in the engine. ``position`` (the row's
+        place in its ledger) is unused; the engine finds entries by date and Sr.
+        """
+        engine = self._copy()
+        engine._remove_entry(sheet_name, old_row)
+        engine._add_entry(sheet_name, new_row)
+        return engine
+
+    def removed(self, sheet_name, position, row):
+        """Return a new engine without row of sheet_name, raising KeyError if it isn't there"""
+        engine = self._copy()
+        engine._remove_entry(sheet_name, row)
+        return engine
+
+    def _remove_entry(self, sheet_name, row):
+        sr, entry_date, _, amount = row[:4]
+        signed = _parse_amount(amount)
+        entry_type = 'Income' if sheet_name == 'Income' else 'Expense'
+
+        day = _parse_date(entry_date)
+        if day is not None:
+            size = self._size
+            # Only entries on the same day can match
+            first = int(np.searchsorted(self._dates[:size], day, side='left'))
+            last = int(np.searchsorted(self._dates[:size], day, side='right'))
+            matches = [
+                position for position in range(first, last)
+                if self._details[position][:2] == (entry_type, str(sr))
+            ]
+            if not matches:
+                raise KeyError(f"{entry_type} entry {sr} is not in the running balance")
+
+            position = matches[0]
+            self._dates[position:size - 1] = self._dates[position + 1:size]
+            self._amounts[position:size - 1] = self._amounts[position + 1:size]
+            start = self._balances[position - 1] if position else 0.0
+            self._balances[position:size - 1] = start + np.cumsum(self._amounts[position:size - 1])
+            del self._details[position]
+            self._size = size - 1
+
+        if sheet_name == 'Income':
+            self.total_income -= signed
+        else:
+            self.total_expenses -= signed
+        self._view = None
+
+    def _add_entry(self, sheet_name, row):
+        sr, entry_date, name, amount = row[:4]
+        signed = _parse_amount(amount)
+        if sheet_name == 'Income':
+            self.total_income += signed
+            entry_type = 'Income'
+        else:
+            self.total_expenses += signed
+            signed = -signed
+            entry_type = 'Expense'
+
+        day = _parse_date(entry_date)
+        if day is None:
+            return
+
+        if self._size == len(self._dates):
+            self._grow()
+
+        size = self._size
+        position = int(np.searchsorted(self._dates[:size], day, side='right'))
+        if position < size:
+            # Back-dated entry: shift the tail and recompute balances from here on
+            self._dates[position + 1:size + 1] = self._dates[position:size]
+            self._amounts[position + 1:size + 1] = self._amounts[position:size]
+        self._dates[position] = day
+        self._amounts[position] = signed
+        start = self._balances[position - 1] if position else 0.0
+        self._balances[position:size + 1] = start + np.cumsum(self._amounts[position:size + 1])
+
+        self._details.insert(position, (entry_type, str(sr), str(name)))
+        self._size = size + 1
+        self._view = None
+
+    def ledger_view(self):
+        """Merged ledger in date order with a running Balance column (built once per engine)"""
+        if self._view is None:
+            types, srs, names = zip(*self._details) if self._details else ((), (), ())
+            amounts = self._amounts[:self._size]
+            self._view = pd.DataFrame({
+                'Date': pd.to_datetime(self._dates[:self._size]).strftime('%Y-%m-%d'),
+                'Type': list(types),
+                'Sr': list(srs),
+                'Name': list(names),
+                'Amount': np.where(np.array(types) == 'Income', amounts, -amounts),
+                'Balance': self._balances[:self._size].copy()
+            }, columns=LEDGER_VIEW_COLUMNS)
+        return self._view
@@ -0,0 +1,96 @@
+"""Compare the table-based Excel exporter with the previous pd.ExcelWriter path
+
+Usage:
+    python benchmarks/bench_excel_export.py --rows 50000 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import excel_export as excel
+from balance import RunningBalance
+
+
+def pandas_excelwriter_export(income_data, expense_data):
+    """The previous create_excel_file: to_excel per sheet, then headers rewritten cell by cell"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        income_data.to_excel(writer, sheet_name='Income', index=False)
+        expense_data.to_excel(writer, sheet_name='Expenses', index=False)
+
+        total_income = income_data['Amount'].astype(float).sum()
+        total_expenses = expense_data['Amount'].astype(float).sum()
+        pd.DataFrame({
+            'Metric': ['Total Income', 'Total Expenses', 'Net Balance'],
+            'Amount': [total_income, total_expenses, total_income - total_expenses]
+        }).to_excel(writer, sheet_name='Summary', index=False)
+
+        workbook = writer.book
+        header_format = workbook.add_format({'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1})
+        money_format = workbook.add_format({'num_format': '"Rs" #,##0.00'})
+        for sheet_name in ['Income', 'Expenses']:
+            worksheet = writer.sheets[sheet_name]
+            worksheet.set_column('A:A', 5)
+            worksheet.set_column('B:B', 12)
+            worksheet.set_column('C:C', 25)
+            worksheet.set_column('D:D', 15, money_format)
+            for col_num, value in enumerate(['Sr', 'Date', 'Name', 'Amount']):
+                worksheet.write(0, col_num, value, header_format)
+        worksheet = writer.sheets['Summary']
+        worksheet.set_column('A:A', 20)
+        worksheet.set_column('B:B', 15, money_format)
+        for col_num, value in enumerate(['Metric', 'Amount']):
+            worksheet.write(0, col_num, value, header_format)
+    return output.getvalue()
+
+
+def make_ledger(count, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730, count), unit='D')
+    return excel.prepare_for_export(pd.DataFrame({
+        'Sr': [str(i + 1) for i in range(count)],
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Name': [f'Member {i % 500}' for i in range(count)],
+        'Amount': rng.uniform(100, 5000, count).round(2)
+    }))
+
+
+def best_of(repeat, export, income_data, expense_data):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workbook = export(income_data, expense_data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(workbook)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel export implementations")
+    parser.add_argument('--rows', type=int, default=50000, help="Income rows (expenses get a quarter as many)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per implementation, best time is reported")
+    args = parser.parse_args()
+
+    income_data = make_ledger(args.rows, 1)
+    expense_data = make_ledger(args.rows // 4, 2)
+    print(f"{args.rows:,} income rows, {args.rows // 4:,} expense rows, best of {args.repeat}")
+
+    for label, export in [
+        ('pd.ExcelWriter (previous)', pandas_excelwriter_export),
+        ('tables (default)', excel.create_excel_file),
+        ('tables + Ledger sheet', lambda income, expense: excel.create_excel_file(income, expense, ledger=RunningBalance(income, expense).ledger_view())),
+        ('tables + month sheets', lambda income, expense: excel.create_excel_file(income, expense, month_sheets=True))
+    ]:
+        elapsed, size = best_of(args.repeat, export, income_data, expense_data)
+        rows_per_second = (len(income_data) + len(expense_data)) / elapsed
+        print(f"{label:>26}: {elapsed:7.3f}s  {rows_per_second:12,.0f} rows/s  {size / 1024:10,.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Compare per-session ledger copies with the shared ledger snapshot
+
+Simulates N concurrent Streamlit sessions holding the income and expense
+ledgers and reports memory per session and total process RSS for each mode.
+Each mode runs in its own subprocess so RSS figures don't bleed into each other.
+
+Usage:
+    python benchmarks/bench_session_memory.py --rows 50000 --sessions 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+
+def make_rows(count, seed):
+    """Build raw sheet rows the way read_sheet_data receives them: lists of strings"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730, count), unit='D')
+    return [
+        [str(i + 1), date.strftime('%Y-%m-%d'), f'Member {i % 500}', f'{amount:.2f}']
+        for i, (date, amount) in enumerate(zip(dates, rng.uniform(100, 5000, count)))
+    ]
+
+
+def rss_kib():
+    """Current resident set size in KiB (Linux), or peak RSS elsewhere"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_mode(mode, rows, sessions):
+    income_rows = make_rows(rows, 1)
+    expense_rows = make_rows(rows // 4, 2)
+    columns = ['Sr', 'Date', 'Name', 'Amount']
+
+    if mode == 'shared':
+        import ledger_store
+        ledger_store.publish(pd.DataFrame(income_rows, columns=columns), pd.DataFrame(expense_rows, columns=columns))
+
+    baseline_rss = rss_kib()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    session_states = []
+    for _ in range(sessions):
+        if mode == 'copied':
+            # Every session loads its own frames from fresh API rows, as with per-session st.session_state
+            state = {
+                'income_data': pd.DataFrame(make_rows(rows, 1), columns=columns),
+                'expense_data': pd.DataFrame(make_rows(rows // 4, 2), columns=columns)
+            }
+        else:
+            snapshot = ledger_store.get_snapshot()
+            state = {
+                'income_data': snapshot.income,
+                'expense_data': snapshot.expense,
+                'ledger_version': snapshot.version
+            }
+        session_states.append(state)
+
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total_rss = rss_kib()
+
+    per_session = (after - before) / sessions / 1024
+    print(f"{mode:>7}: {per_session:12,.1f} KiB/session  "
+          f"{(total_rss - baseline_rss) / 1024:10,.1f} MiB RSS growth  {total_rss / 1024:10,.1f} MiB total RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-session memory for ledger storage strategies")
+    parser.add_argument('--rows', type=int, default=50000, help="Income rows (expenses get a quarter as many)")
+    parser.add_argument('--sessions', type=int, default=50, help="Number of simulated concurrent sessions")
+    parser.add_argument('--mode', choices=['copied', 'shared'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.rows, args.sessions)
+        return
+
+    print(f"{args.sessions} sessions, {args.rows:,} income rows, {args.rows // 4:,} expense rows")
+    for mode in ['copied', 'shared']:
+        subprocess.run([
+            sys.executable, os.path.abspath(__file__),
+            '--rows', str(args.rows), '--sessions', str(args.sessions), '--mode', mode
+        ], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import copy
+
+import pandas as pd
+
+from member_index import normalize_name
+
+
+def _amount_in_cents(amount):
+    value = pd.to_numeric(amount, errors='coerce')
+    return None if pd.isna(value) else int(round(float(value) * 100))
+
+def _normalize_date(entry_date):
+    value = pd.to_datetime(entry_date, errors='coerce')
+    return '' if pd.isna(value) else value.strftime('%Y-%m-%d')
+
+def entry_key(sheet_name, entry_date, name, amount):
+    """Hashable (sheet, date, name, amount) key that ignores formatting differences"""
+    return (sheet_name, _normalize_date(entry_date), normalize_name(name), _amount_in_cents(amount))
+
+def entry_keys(sheet_name, data):
+    """Vectorized entry_key for every row of a ledger-shaped DataFrame"""
+    dates = pd.to_datetime(data['Date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    names = data['Name'].map(normalize_name)
+    cents = (pd.to_numeric(data['Amount'], errors='coerce') * 100).round()
+    amounts = [None if pd.isna(value) else int(value) for value in cents.tolist()]
+    return [(sheet_name, entry_date, name, amount) for entry_date, name, amount in zip(dates, names, amounts)]
+
+
+class DuplicateIndex:
+    """Hash index over normalized (date, name, amount) entries of both ledgers
+
+    Lets entry forms and imports check for a likely duplicate receipt in O(1)
+    per row instead of scanning the ledger.
+    """
+
+    def __init__(self, income_data, expense_data):
+        self._counts = {}
+        for sheet_name, data in [('Income', income_data), ('Expenses', expense_data)]:
+            if data.empty:
+                continue
+            for key in entry_keys(sheet_name, data):
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def __len__(self):
+        return len(self._counts)
+
+    def count(self, sheet_name, entry_date, name, amount):
+        """How many existing entries share this normalized date, name and amount"""
+        return self._counts.get(entry_key(sheet_name, entry_date, name, amount), 0)
+
+    def is_duplicate(self, sheet_name, entry_date, name, amount):
+        return self.count(sheet_name, entry_date, name, amount) > 0
+
+    def _copy(self):
+        index = copy.copy(self)
+        index._counts = dict(self._counts)
+        return index
+
+    def _add_entry(self, sheet_name, row):
+        key = entry_key(sheet_name, *row[1:4])
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _remove_entry(self, sheet_name, row):
+        key = entry_key(sheet_name, *row[1:4])
+        count = self._counts.get(key, 0)
+        if count == 0:
+            raise KeyError(f"{sheet_name} entry {row[0]} is not in the duplicate index")
+        if count == 1:
+            del self._counts[key]
+        else:
+            self._counts[key] = count - 1
+
+    def extended(self, sheet_name, rows):
+        """Return a new index with [Sr, Date, Name, Amount] rows registered, leaving this one unchanged"""
+        index = self._copy()
+        for row in rows:
+            index._add_entry(sheet_name, row)
+        return index
+
+    def replaced(self, sheet_name, position, old_row, new_row):
+        """Return a new index with old_row swapped for new_row, raising KeyError if old_row isn't counted"""
+        index = self._copy()
+        index._remove_entry(sheet_name, old_row)
+        index._add_entry(sheet_name, new_row)
+        return index
+
+    def removed(self, sheet_name, position, row):
+        """Return a new index without row, raising KeyError if it isn't counted"""
+        index = self._copy()
+        index._remove_entry(sheet_name, row)
+        return index
+
+    def flag_duplicates(self, sheet_name, data):
+        """Boolean Series marking rows of an import that already exist or repeat earlier in the batch"""
+        seen = set()
+        flags = []
+        for key in entry_keys(sheet_name, data):
+            flags.append(key in seen or key in self._counts)
+            seen.add(key)
+        return pd.Series(flags, index=data.index, dtype=bool)
@@ -1,82 +1,227 @@
+import hashlib
+import re
 import pandas as pd
 from io import BytesIO
 import xlsxwriter
 
-def create_excel_file(income_data, expense_data):
-    """Create an Excel file with income and expense data in separate sheets"""
-    output = BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # Write income data
-        if not income_data.empty:
-            income_data.to_excel(writer, sheet_name='Income', index=False)
-        else:
-            pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount']).to_excel(writer, sheet_name='Income', index=False)
-        
-        # Write expense data
-        if not expense_data.empty:
-            expense_data.to_excel(writer, sheet_name='Expenses', index=False)
-        else:
-            pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount']).to_excel(writer, sheet_name='Expenses', index=False)
-        
-        # Create summary sheet
-        total_income = income_data['Amount'].astype(float).sum() if not income_data.empty else 0
-        total_expenses = expense_data['Amount'].astype(float).sum() if not expense_data.empty else 0
-        net_balance = total_income - total_expenses
-        
-        summary_data = pd.DataFrame({
-            'Metric': ['Total Income', 'Total Expenses', 'Net Balance'],
-            'Amount': [total_income, total_expenses, net_balance]
-        })
-        summary_data.to_excel(writer, sheet_name='Summary', index=False)
-        
-        # Get workbook and add formatting
-        workbook = writer.book
-        
-        # Define formats
-        header_format = workbook.add_format({
+from member_index import normalize_name
+
+# Day zero of Excel's 1900 date system
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+def prepare_for_export(data):
+    """Return a copy of a ledger with the Amount column converted to numbers"""
+    data = data.copy()
+    if not data.empty:
+        data['Amount'] = pd.to_numeric(data['Amount'], errors='coerce').fillna(0)
+    return data
+
+def _define_formats(workbook):
+    """Create every cell format once per workbook"""
+    return {
+        'header': workbook.add_format({
             'bold': True,
             'text_wrap': True,
             'valign': 'top',
             'fg_color': '#D7E4BC',
             'border': 1
-        })
-        
-        money_format = workbook.add_format({'num_format': 'Rs #,##0.00'})
-        
-        # Format income sheet
-        if 'Income' in writer.sheets:
-            worksheet = writer.sheets['Income']
-            worksheet.set_column('A:A', 5)  # Sr column
-            worksheet.set_column('B:B', 12)  # Date column
-            worksheet.set_column('C:C', 25)  # Name column
-            worksheet.set_column('D:D', 15, money_format)  # Amount column
-            
-            # Apply header format
-            for col_num, value in enumerate(['Sr', 'Date', 'Name', 'Amount']):
-                worksheet.write(0, col_num, value, header_format)
-        
-        # Format expense sheet
-        if 'Expenses' in writer.sheets:
-            worksheet = writer.sheets['Expenses']
-            worksheet.set_column('A:A', 5)  # Sr column
-            worksheet.set_column('B:B', 12)  # Date column
-            worksheet.set_column('C:C', 25)  # Name column
-            worksheet.set_column('D:D', 15, money_format)  # Amount column
-            
-            # Apply header format
-            for col_num, value in enumerate(['Sr', 'Date', 'Name', 'Amount']):
-                worksheet.write(0, col_num, value, header_format)
-        
-        # Format summary sheet
-        if 'Summary' in writer.sheets:
-            worksheet = writer.sheets['Summary']
-            worksheet.set_column('A:A', 20)  # Metric column
-            worksheet.set_column('B:B', 15, money_format)  # Amount column
-            
-            # Apply header format
-            for col_num, value in enumerate(['Metric', 'Amount']):
-                worksheet.write(0, col_num, value, header_format)
+        }),
+        'money': workbook.add_format({'num_format': '"Rs" #,##0.00'}),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+        'month': workbook.add_format({'num_format': 'yyyy-mm'})
+    }
+
+def _new_workbook(output):
+    # Ledger text is written as-is, never turned into formulas or links
+    return xlsxwriter.Workbook(output, {
+        'in_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False
+    })
+
+def _sort_ledger(data):
+    """Return the ledger sorted by date with parsed Date, Month and numeric Amount helper columns"""
+    dates = pd.to_datetime(data['Date'], errors='coerce')
+    sorted_data = pd.DataFrame({
+        'Sr': data['Sr'].astype(str),
+        'Date': data['Date'].astype(str),
+        'Name': data['Name'].astype(str),
+        'Amount': pd.to_numeric(data['Amount'], errors='coerce').fillna(0).astype(float),
+        'Parsed': dates,
+        'Month': dates.dt.to_period('M')
+    })
+    # Stable sort keeps sheet order within a day; undated rows go last
+    return sorted_data.sort_values('Parsed', kind='stable', na_position='last').reset_index(drop=True)
+
+def _excel_dates(data):
+    """Dates as Excel serial numbers, keeping the original text where it can't be parsed
+
+    Serial numbers are computed in one vectorized step, which is much cheaper
+    than letting xlsxwriter convert a datetime per cell. Uses the Parsed column
+    from _sort_ledger when present and parses the Date column otherwise.
+    """
+    parsed = data['Parsed'] if 'Parsed' in data else pd.to_datetime(data['Date'], errors='coerce')
+    serials = (parsed - EXCEL_EPOCH) / pd.Timedelta(days=1)
+    return [
+        text if pd.isna(serial) else serial
+        for serial, text in zip(serials.tolist(), data['Date'].astype(str))
+    ]
+
+def _write_table(worksheet, name, columns, formats, first_col=0):
+    """Write (header, values, format, width) columns as an Excel table with one write_column per column"""
+    row_count = max(len(columns[0][1]), 1)  # Excel tables need at least one data row
+    worksheet.add_table(0, first_col, row_count, first_col + len(columns) - 1, {
+        'name': name,
+        'style': 'Table Style Light 9',
+        'columns': [{'header': header, 'header_format': formats['header']} for header, _, _, _ in columns]
+    })
+    for offset, (header, values, cell_format, width) in enumerate(columns):
+        worksheet.set_column(first_col + offset, first_col + offset, width, cell_format)
+        worksheet.write_column(1, first_col + offset, values, cell_format)
+
+def _write_ledger_sheet(workbook, sheet_name, sorted_data, formats):
+    worksheet = workbook.add_worksheet(sheet_name)
+    _write_table(worksheet, f'{sheet_name}Table', [
+        ('Sr', sorted_data['Sr'].tolist(), None, 28),
+        ('Date', _excel_dates(sorted_data), formats['date'], 12),
+        ('Name', sorted_data['Name'].tolist(), None, 25),
+        ('Amount', sorted_data['Amount'].tolist(), formats['money'], 15)
+    ], formats)
+
+def create_excel_file(income_data, expense_data, ledger=None, month_sheets=False):
+    """Create an Excel file with Income, Expenses and Summary sheets
+
+    Formats are defined once and every column goes out in a single write_column
+    call. The Summary sheet uses live formulas over the Income and Expenses
+    tables (with cached results for readers that don't recalculate). If a merged
+    ledger with a running Balance column is given it is added as a Ledger sheet.
+    Pass ``month_sheets=True`` to add a sheet per month; it writes every row a
+    second time, so it is off unless asked for.
+    """
+    output = BytesIO()
+    workbook = _new_workbook(output)
+    formats = _define_formats(workbook)
+    
+    income_sorted = _sort_ledger(income_data)
+    expense_sorted = _sort_ledger(expense_data)
+    
+    _write_ledger_sheet(workbook, 'Income', income_sorted, formats)
+    _write_ledger_sheet(workbook, 'Expenses', expense_sorted, formats)
+    # Filled in last, once the month totals are known
+    summary_sheet = workbook.add_worksheet('Summary')
+    
+    if ledger is not None:
+        worksheet = workbook.add_worksheet('Ledger')
+        _write_table(worksheet, 'LedgerTable', [
+            ('Date', _excel_dates(ledger), formats['date'], 12),
+            ('Type', ledger['Type'].tolist(), None, 10),
+            ('Sr', ledger['Sr'].tolist(), None, 28),
+            ('Name', ledger['Name'].tolist(), None, 25),
+            ('Amount', ledger['Amount'].tolist(), formats['money'], 15),
+            ('Balance', ledger['Balance'].tolist(), formats['money'], 15)
+        ], formats)
+    
+    # One pass over each pre-sorted ledger groups rows by month
+    income_months = {month: rows for month, rows in income_sorted.dropna(subset=['Month']).groupby('Month', sort=False)}
+    expense_months = {month: rows for month, rows in expense_sorted.dropna(subset=['Month']).groupby('Month', sort=False)}
+    months = sorted(set(income_months) | set(expense_months))
+    
+    empty = income_sorted.iloc[0:0]
+    for month in months if month_sheets else []:
+        month_income = income_months.get(month, empty)
+        month_expense = expense_months.get(month, empty)
+        worksheet = workbook.add_worksheet(str(month))
+        table_name = f'Month_{month.year}_{month.month:02d}'
+        _write_table(worksheet, f'{table_name}_Income', [
+            ('Sr', month_income['Sr'].tolist(), None, 28),
+            ('Date', _excel_dates(month_income), formats['date'], 12),
+            ('Name', month_income['Name'].tolist(), None, 25),
+            ('Income', month_income['Amount'].tolist(), formats['money'], 15)
+        ], formats)
+        _write_table(worksheet, f'{table_name}_Expenses', [
+            ('Sr', month_expense['Sr'].tolist(), None, 28),
+            ('Date', _excel_dates(month_expense), formats['date'], 12),
+            ('Name', month_expense['Name'].tolist(), None, 25),
+            ('Expenses', month_expense['Amount'].tolist(), formats['money'], 15)
+        ], formats, first_col=5)
+    
+    # Summary: live formulas over the tables, with cached values
+    total_income = float(income_sorted['Amount'].sum())
+    total_expenses = float(expense_sorted['Amount'].sum())
+    
+    summary_sheet.set_column('A:A', 20)  # Metric / Month column
+    summary_sheet.set_column('B:D', 15, formats['money'])  # Amount columns
+    summary_sheet.write_row(0, 0, ['Metric', 'Amount'], formats['header'])
+    summary_sheet.write_column(1, 0, ['Total Income', 'Total Expenses', 'Net Balance'])
+    summary_sheet.write_formula(1, 1, '=SUM(IncomeTable[Amount])', formats['money'], total_income)
+    summary_sheet.write_formula(2, 1, '=SUM(ExpensesTable[Amount])', formats['money'], total_expenses)
+    summary_sheet.write_formula(3, 1, '=B2-B3', formats['money'], total_income - total_expenses)
+    
+    if months:
+        first_row = 5
+        summary_sheet.write_row(first_row, 0, ['Month', 'Income', 'Expenses', 'Net'], formats['header'])
+        summary_sheet.write_column(first_row + 1, 0, [month.to_timestamp().to_pydatetime() for month in months], formats['month'])
+        for offset, month in enumerate(months):
+            row = first_row + 1 + offset
+            cell = f'A{row + 1}'
+            month_income = float(income_months[month]['Amount'].sum()) if month in income_months else 0.0
+            month_expense = float(expense_months[month]['Amount'].sum()) if month in expense_months else 0.0
+            summary_sheet.write_formula(row, 1, f'=SUMIFS(IncomeTable[Amount],IncomeTable[Date],">="&{cell},IncomeTable[Date],"<"&EDATE({cell},1))', formats['money'], month_income)
+            summary_sheet.write_formula(row, 2, f'=SUMIFS(ExpensesTable[Amount],ExpensesTable[Date],">="&{cell},ExpensesTable[Date],"<"&EDATE({cell},1))', formats['money'], month_expense)
+            summary_sheet.write_formula(row, 3, f'=B{row + 1}-C{row + 1}', formats['money'], month_income - month_expense)
+    
+    workbook.close()
+    
+    output.seek(0)
+    return output.getvalue()
+
+def safe_filename(text):
+    """Turn free text into a file name part, keeping letters of any script so Urdu names stay readable"""
+    return re.sub(r'[^\w-]+', '_', text).strip('_') or 'unnamed'
+
+def member_statement_filename(member, label):
+    """File name for a member statement, e.g. statement_2025_Ali_Khan_1a2b3c4d.xlsx
+
+    Different names can clean to the same text ("Ali Khan", "Ali.Khan"), so a
+    hash of the member's index key keeps the names apart.
+    """
+    digest = hashlib.sha1(normalize_name(member['name']).encode('utf-8')).hexdigest()[:8]
+    return f'statement_{label}_{safe_filename(member["name"])}_{digest}.xlsx'
+
+def create_member_statement(member, payments):
+    """Create an Excel statement for one member from a member index rollup and their payment rows"""
+    output = BytesIO()
+    workbook = _new_workbook(output)
+    formats = _define_formats(workbook)
+    
+    payments_sorted = _sort_ledger(payments)
+    worksheet = workbook.add_worksheet('Payments')
+    _write_table(worksheet, 'PaymentsTable', [
+        ('Sr', payments_sorted['Sr'].tolist(), None, 28),
+        ('Date', _excel_dates(payments_sorted), formats['date'], 12),
+        ('Name', payments_sorted['Name'].tolist(), None, 25),
+        ('Amount', payments_sorted['Amount'].tolist(), formats['money'], 15)
+    ], formats)
+    
+    # Per-month totals straight from the rollup
+    months = sorted(member['months'].items())
+    worksheet = workbook.add_worksheet('Monthly')
+    _write_table(worksheet, 'MonthlyTable', [
+        ('Month', [month for month, _ in months], None, 10),
+        ('Amount', [amount for _, amount in months], formats['money'], 15)
+    ], formats)
+    
+    worksheet = workbook.add_worksheet('Summary')
+    worksheet.set_column('A:A', 15)  # Metric column
+    worksheet.set_column('B:B', 25)  # Value column
+    worksheet.write_row(0, 0, ['Metric', 'Value'], formats['header'])
+    worksheet.write_column(1, 0, ['Member', 'Total Paid', 'Payments', 'Last Payment'])
+    worksheet.write_string(1, 1, member['name'])
+    worksheet.write_number(2, 1, member['total'], formats['money'])
+    worksheet.write_number(3, 1, member['count'])
+    worksheet.write_string(4, 1, member['last_date'])
+    
+    workbook.close()
     
     output.seek(0)
     return output.getvalue()
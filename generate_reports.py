@@ -0,0 +1,149 @@
+"""Generate yearly union fund reports from the command line
+
+Builds one Excel workbook per month and per member plus a consolidated one,
+spread across CPU cores with a process pool. The ledger is loaded once and
+handed to each worker a single time when the pool starts, so tasks only carry
+a small report key.
+
+Usage:
+    python generate_reports.py --year 2025
+    python generate_reports.py --year 2025 --input union_funds_complete.xlsx --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import excel_export as excel
+from balance import RunningBalance
+from member_index import MemberIndex
+
+LEDGER_COLUMNS = ['Sr', 'Date', 'Name', 'Amount']
+
+# Ledger shared read-only by every task in a worker process
+_worker_ledger = {}
+
+
+def load_ledger(input_path=None):
+    """Load income and expense ledgers from an exported workbook or from Google Sheets"""
+    if input_path:
+        sheets = pd.read_excel(input_path, sheet_name=['Income', 'Expenses'], dtype=str)
+        income_data = sheets['Income'].fillna('')
+        expense_data = sheets['Expenses'].fillna('')
+    else:
+        import google_sheets_api as gsa
+        income_data = gsa.read_sheet_data('Income')
+        expense_data = gsa.read_sheet_data('Expenses')
+
+    income_data = excel.prepare_for_export(income_data[LEDGER_COLUMNS])
+    expense_data = excel.prepare_for_export(expense_data[LEDGER_COLUMNS])
+    return income_data, expense_data
+
+
+def filter_year(data, year):
+    """Keep only the rows dated in the given year"""
+    dates = pd.to_datetime(data['Date'], errors='coerce')
+    return data[dates.dt.year == year].reset_index(drop=True)
+
+
+def _init_worker(income_data, expense_data, members):
+    _worker_ledger['income'] = income_data
+    _worker_ledger['expense'] = expense_data
+    _worker_ledger['members'] = members
+    _worker_ledger['income_month'] = pd.to_datetime(income_data['Date'], errors='coerce').dt.strftime('%Y-%m')
+    _worker_ledger['expense_month'] = pd.to_datetime(expense_data['Date'], errors='coerce').dt.strftime('%Y-%m')
+
+
+def _build_report(job):
+    """Build one workbook for a (kind, key, output_path) job and return its size in bytes"""
+    kind, key, output_path = job
+    income_data = _worker_ledger['income']
+    expense_data = _worker_ledger['expense']
+
+    if kind == 'member':
+        # Statements come straight from the member index rollup and its row positions
+        member = _worker_ledger['members'][key]
+        workbook = excel.create_member_statement(member, income_data.iloc[member['positions']])
+    elif kind == 'month':
+        income_part = income_data[_worker_ledger['income_month'] == key]
+        expense_part = expense_data[_worker_ledger['expense_month'] == key]
+        workbook = excel.create_excel_file(income_part, expense_part)
+    else:
+        ledger = RunningBalance(income_data, expense_data).ledger_view()
+        workbook = excel.create_excel_file(income_data, expense_data, ledger=ledger, month_sheets=True)
+
+    with open(output_path, 'wb') as f:
+        f.write(workbook)
+    return len(workbook)
+
+
+def plan_jobs(income_data, expense_data, members, year, output_dir):
+    """List every report to build for the year, raising ValueError if two share an output path"""
+    months = pd.concat([
+        pd.to_datetime(income_data['Date'], errors='coerce'),
+        pd.to_datetime(expense_data['Date'], errors='coerce')
+    ]).dropna().dt.strftime('%Y-%m')
+
+    jobs = [('consolidated', None, os.path.join(output_dir, f'union_funds_{year}.xlsx'))]
+    for month in sorted(months.unique()):
+        jobs.append(('month', month, os.path.join(output_dir, 'months', f'union_funds_{month}.xlsx')))
+
+    for key, member in sorted(members.items()):
+        filename = excel.member_statement_filename(member, year)
+        jobs.append(('member', key, os.path.join(output_dir, 'members', filename)))
+
+    # Two jobs writing the same path would silently overwrite one report
+    seen = set()
+    for _, key, output_path in jobs:
+        normalized = os.path.normcase(output_path)
+        if normalized in seen:
+            raise ValueError(f"Two reports would be written to {output_path}")
+        seen.add(normalized)
+    return jobs
+
+
+def generate_reports(income_data, expense_data, year, output_dir, workers=None):
+    """Build all reports in parallel and return (report_count, total_bytes, elapsed_seconds)"""
+    income_data = filter_year(income_data, year)
+    expense_data = filter_year(expense_data, year)
+
+    members = dict(MemberIndex(income_data).members())
+    jobs = plan_jobs(income_data, expense_data, members, year, output_dir)
+    os.makedirs(os.path.join(output_dir, 'months'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'members'), exist_ok=True)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(income_data, expense_data, members)
+    ) as pool:
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        sizes = list(pool.map(_build_report, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    return len(jobs), sum(sizes), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate monthly, per-member and consolidated union fund reports")
+    parser.add_argument('--year', type=int, default=pd.Timestamp.now().year, help="Year to report on (default: current year)")
+    parser.add_argument('--output', default='reports', help="Directory to write workbooks to (default: reports)")
+    parser.add_argument('--input', help="Read the ledger from a complete Excel export instead of Google Sheets")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    income_data, expense_data = load_ledger(args.input)
+    report_count, total_bytes, elapsed = generate_reports(
+        income_data, expense_data, args.year, args.output, workers=args.workers
+    )
+
+    rate = report_count / elapsed if elapsed > 0 else float('inf')
+    print(f"Generated {report_count} reports ({total_bytes / 1024:,.1f} KiB) in {elapsed:.2f}s "
+          f"- {rate:,.1f} reports/s")
+
+
+if __name__ == '__main__':
+    main()
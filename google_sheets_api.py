@@ -3,12 +3,55 @@ from googleapiclient.discovery import build
 import pandas as pd
 import numpy as np
 import os
+import re
 import json
+import time
+import secrets
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
 SPREADSHEET_ID = '14BiC6WpAd0UyWae6Efg1AQTwnCWpDTR9dla7FbhzHB8'
 
+# Writers stamp a fresh token here after every change so readers can detect it cheaply
+VERSION_SHEET = 'Meta'
+VERSION_ROWS = {'Income': 1, 'Expenses': 2}
+
+# Crockford base32 alphabet used for ULID-style row IDs
+_ID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_id_lock = threading.Lock()
+_last_id_state = {'timestamp': 0, 'random': 0}
+
+
+class SheetConflictError(Exception):
+    """Raised when the target row no longer holds the entry a write expected"""
+    pass
+
+
+def _encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(_ID_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+def generate_row_id():
+    """Generate a sortable, collision-free row ID (ULID-style: 48-bit ms timestamp + 80 random bits)
+
+    IDs generated in the same millisecond by this process are kept monotonic by
+    incrementing the random part instead of drawing a new one.
+    """
+    with _id_lock:
+        timestamp = int(time.time() * 1000)
+        if timestamp <= _last_id_state['timestamp']:
+            timestamp = _last_id_state['timestamp']
+            random_part = (_last_id_state['random'] + 1) & ((1 << 80) - 1)
+        else:
+            random_part = secrets.randbits(80)
+        _last_id_state['timestamp'] = timestamp
+        _last_id_state['random'] = random_part
+    return _encode_base32(timestamp, 10) + _encode_base32(random_part, 16)
+
 def get_sheets_service():
     """Get Google Sheets service with credentials from environment variables"""
     try:
@@ -43,8 +86,11 @@ def get_sheets_service():
         print(f"Error creating Google Sheets service: {str(e)}")
         raise e
 
-def check_sheet_exists(sheet_name):
-    """Check if a sheet exists in the spreadsheet"""
+def check_sheet_exists(sheet_name, strict=False):
+    """Check if a sheet exists in the spreadsheet
+
+    API errors count as "missing" unless strict is set, then they are re-raised.
+    """
     try:
         service = get_sheets_service()
         spreadsheet = service.get(spreadsheetId=SPREADSHEET_ID).execute()
@@ -52,6 +98,8 @@ def check_sheet_exists(sheet_name):
         return sheet_name in sheet_names
     except Exception as e:
         print(f"Error checking if sheet exists: {str(e)}")
+        if strict:
+            raise
         return False
 
 def clean_data_for_sheets(data):
@@ -75,8 +123,12 @@ def clean_data_for_sheets(data):
         return cleaned_data
     return data
 
-def read_sheet_data(sheet_name):
-    """Read data from Google Sheets with improved error handling and data cleaning"""
+def read_sheet_data(sheet_name, strict=False):
+    """Read data from Google Sheets with improved error handling and data cleaning
+
+    With ``strict=True`` API errors are raised instead of returning an empty
+    frame, so callers can tell a failed read from an empty sheet.
+    """
     try:
         service = get_sheets_service()
         
@@ -132,6 +184,8 @@ def read_sheet_data(sheet_name):
             
     except Exception as e:
         print(f"Error reading sheet data from {sheet_name}: {str(e)}")
+        if strict:
+            raise
         return pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
 
 def write_sheet_data(sheet_name, data):
@@ -190,6 +244,272 @@ def append_sheet_data(sheet_name, data):
         print(f"Error appending sheet data: {str(e)}")
         raise e
 
+def _row_number_from_range(updated_range):
+    """Extract the first row number from an A1 range such as 'Income!A12:D12'"""
+    match = re.search(r'![A-Z]+(\d+)', updated_range or '')
+    return int(match.group(1)) if match else None
+
+def append_rows(sheet_name, rows, expected_row_number=None):
+    """Append rows in one request without touching the rest of the sheet
+
+    The Sheets API serializes appends server-side, so concurrent writers never
+    overwrite each other. If ``expected_row_number`` is given and the first row
+    landed somewhere else, another writer got there first and the caller's local
+    copy is stale. Returns ``(first_row_number, is_stale)``.
+    """
+    try:
+        result = append_sheet_data(sheet_name, rows)
+        row_number = _row_number_from_range(result.get('updates', {}).get('updatedRange'))
+        is_stale = expected_row_number is not None and row_number != expected_row_number
+        return row_number, is_stale
+    except Exception as e:
+        print(f"Error appending rows to {sheet_name}: {str(e)}")
+        raise e
+
+def append_row(sheet_name, row, expected_row_number=None):
+    """Append a single row, see append_rows"""
+    return append_rows(sheet_name, [row], expected_row_number=expected_row_number)
+
+def read_row_index(sheet_name, strict=False):
+    """Build an ID -> sheet row number index from the Sr column
+
+    Returns ``(row_index, last_row)`` where last_row is the last sheet row with
+    any data, including rows read_sheet_data filters out. IDs that appear on more
+    than one row are left out of the index. With ``strict=True``
+    API errors are raised instead of returning an empty index.
+    """
+    try:
+        service = get_sheets_service()
+        result = service.values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f'{sheet_name}!A:D'
+        ).execute()
+        
+        values = result.get('values', [])
+        row_index = {}
+        duplicate_ids = set()
+        # Row 1 is the header, data starts at row 2
+        for row_number, row in enumerate(values[1:], start=2):
+            if row and row[0] != '':
+                if row[0] in row_index:
+                    duplicate_ids.add(row[0])
+                row_index[row[0]] = row_number
+        
+        # Legacy IDs used on several rows can't address a single row
+        for row_id in duplicate_ids:
+            del row_index[row_id]
+        return row_index, max(len(values), 1)
+    except Exception as e:
+        print(f"Error reading row index from {sheet_name}: {str(e)}")
+        if strict:
+            raise
+        return {}, 1
+
+def get_sheet_id(sheet_name):
+    """Get the numeric sheet ID needed for structural batchUpdate requests"""
+    service = get_sheets_service()
+    spreadsheet = service.get(
+        spreadsheetId=SPREADSHEET_ID,
+        fields='sheets.properties(sheetId,title)'
+    ).execute()
+    for sheet in spreadsheet['sheets']:
+        if sheet['properties']['title'] == sheet_name:
+            return sheet['properties']['sheetId']
+    raise ValueError(f"Sheet not found: {sheet_name}")
+
+def _check_row_precondition(service, sheet_name, row_id, row_number):
+    """Verify the sheet still holds row_id at row_number and return the ID on the row below it"""
+    if row_number is None:
+        raise SheetConflictError(f"Entry {row_id} is not in the {sheet_name} index")
+    
+    result = service.values().get(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f'{sheet_name}!A{row_number}:A{row_number + 1}'
+    ).execute()
+    ids = [row[0] if row else '' for row in result.get('values', [])] + ['', '']
+    if ids[0] != row_id:
+        raise SheetConflictError(f"Row {row_number} in {sheet_name} no longer holds entry {row_id}")
+    return ids[1]
+
+def _read_row(service, sheet_name, row_number):
+    result = service.values().get(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f'{sheet_name}!A{row_number}:D{row_number}'
+    ).execute()
+    # The API drops trailing empty cells
+    row = (result.get('values') or [[]])[0]
+    return row + [''] * (4 - len(row))
+
+def update_row(sheet_name, row_id, row, row_number):
+    """Overwrite a single entry in place with one values().update on its row range
+
+    The Sheets API has no conditional writes, so the row is checked before and
+    re-read after the update. Within one process callers hold
+    ledger_store.sheet_write_lock() so the check and write can't interleave. A
+    write from another process between the check and the update can still hit
+    the wrong entry; the re-read then raises SheetConflictError so the caller
+    reloads, but it can't undo the write.
+    """
+    try:
+        service = get_sheets_service()
+        _check_row_precondition(service, sheet_name, row_id, row_number)
+        
+        values = clean_data_for_sheets([row])
+        body = {'values': values}
+        result = service.values().update(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f'{sheet_name}!A{row_number}:D{row_number}',
+            valueInputOption='RAW',
+            body=body
+        ).execute()
+        
+        if _read_row(service, sheet_name, row_number) != values[0]:
+            raise SheetConflictError(f"Row {row_number} in {sheet_name} changed while entry {row_id} was being updated")
+        return result
+    except SheetConflictError:
+        raise
+    except Exception as e:
+        print(f"Error updating row in {sheet_name}: {str(e)}")
+        raise e
+
+def delete_row(sheet_name, row_id, row_number):
+    """Delete a single entry with a deleteDimension request; rows below it move up by one
+
+    Checked before and after like update_row: afterwards row_number must hold
+    the entry that was below it. The same gap between processes remains.
+    """
+    try:
+        service = get_sheets_service()
+        next_id = _check_row_precondition(service, sheet_name, row_id, row_number)
+        
+        request = {
+            'deleteDimension': {
+                'range': {
+                    'sheetId': get_sheet_id(sheet_name),
+                    'dimension': 'ROWS',
+                    'startIndex': row_number - 1,
+                    'endIndex': row_number
+                }
+            }
+        }
+        result = service.batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={'requests': [request]}
+        ).execute()
+        
+        if _read_row(service, sheet_name, row_number)[0] != next_id:
+            raise SheetConflictError(f"Rows in {sheet_name} moved while entry {row_id} was being deleted")
+        return result
+    except SheetConflictError:
+        raise
+    except Exception as e:
+        print(f"Error deleting row from {sheet_name}: {str(e)}")
+        raise e
+
+def read_sheet_version(sheet_name):
+    """Return the current version token of sheet_name, or None if none was stamped yet
+
+    Raises on API errors other than the version sheet not existing yet.
+    """
+    service = get_sheets_service()
+    row_number = VERSION_ROWS[sheet_name]
+    try:
+        result = service.values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f'{VERSION_SHEET}!A{row_number}:B{row_number}'
+        ).execute()
+    except Exception:
+        if not check_sheet_exists(VERSION_SHEET, strict=True):
+            return None
+        raise
+    
+    values = result.get('values', [])
+    if values and len(values[0]) >= 2 and values[0][0] == sheet_name:
+        return values[0][1]
+    return None
+
+def bump_sheet_version(sheet_name):
+    """Stamp a new version token for sheet_name in the version sheet and return it"""
+    token = generate_row_id()
+    row_number = VERSION_ROWS[sheet_name]
+    body = {'values': [[sheet_name, token]]}
+    try:
+        service = get_sheets_service()
+        try:
+            service.values().update(
+                spreadsheetId=SPREADSHEET_ID,
+                range=f'{VERSION_SHEET}!A{row_number}:B{row_number}',
+                valueInputOption='RAW',
+                body=body
+            ).execute()
+        except Exception:
+            # The version sheet is created lazily on the first write
+            create_sheet_if_not_exists(VERSION_SHEET)
+            service.values().update(
+                spreadsheetId=SPREADSHEET_ID,
+                range=f'{VERSION_SHEET}!A{row_number}:B{row_number}',
+                valueInputOption='RAW',
+                body=body
+            ).execute()
+        return token
+    except Exception as e:
+        print(f"Error bumping version for {sheet_name}: {str(e)}")
+        return None
+
+def probe_sheet_versions():
+    """Cheaply fetch {sheet_name: (row_count, version_token)} for the ledger sheets
+
+    A single metadata-only spreadsheets.get: the fields mask limits the response
+    to grid row counts plus the few cells of the version sheet, so no ledger
+    values are transferred.
+    """
+    service = get_sheets_service()
+    ranges = [f'{name}!A1' for name in VERSION_ROWS] + [f'{VERSION_SHEET}!A1:B{len(VERSION_ROWS)}']
+    fields = 'sheets(properties(title,gridProperties(rowCount)),data(rowData(values(formattedValue))))'
+    try:
+        spreadsheet = service.get(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=ranges,
+            includeGridData=True,
+            fields=fields
+        ).execute()
+    except Exception:
+        # The version sheet does not exist until the first write, fall back to row counts
+        # only then; any other error (quota, server) is raised so callers keep what they know
+        if check_sheet_exists(VERSION_SHEET, strict=True):
+            raise
+        spreadsheet = service.get(
+            spreadsheetId=SPREADSHEET_ID,
+            fields='sheets(properties(title,gridProperties(rowCount)))'
+        ).execute()
+    
+    row_counts = {}
+    tokens = {}
+    for sheet in spreadsheet.get('sheets', []):
+        title = sheet['properties']['title']
+        row_counts[title] = sheet['properties'].get('gridProperties', {}).get('rowCount')
+        if title == VERSION_SHEET:
+            for grid in sheet.get('data', []):
+                for row in grid.get('rowData', []):
+                    cells = [cell.get('formattedValue', '') for cell in row.get('values', [])]
+                    if len(cells) >= 2:
+                        tokens[cells[0]] = cells[1]
+    
+    return {name: (row_counts.get(name), tokens.get(name)) for name in VERSION_ROWS}
+
+def versions_changed(known_versions, current_versions):
+    """Return the sheet names whose probe result differs from what we last saw
+
+    A known row count of None means "only compare the token", used when the
+    row count was never probed.
+    """
+    changed = []
+    for name, (row_count, token) in current_versions.items():
+        known_row_count, known_token = known_versions.get(name, (None, None))
+        if known_token != token or (known_row_count is not None and known_row_count != row_count):
+            changed.append(name)
+    return changed
+
 def create_sheet_if_not_exists(sheet_name):
     """Create a new sheet if it doesn't exist"""
     try:
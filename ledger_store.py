@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+# pandas >= 3.0 always uses copy-on-write, older versions need it switched on so
+# that derived frames never silently share and mutate snapshot data
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# One immutable, versioned view of both ledgers shared by every session in the process
+LedgerSnapshot = namedtuple('LedgerSnapshot', ['version', 'income', 'expense', 'sheet_versions'])
+
+LEDGER_KEYS = {'Income': 'income', 'Expenses': 'expense'}
+
+_lock = threading.RLock()
+# Held across a sheet write and the matching snapshot update; separate from _lock
+# so reads and probes never wait on a Google Sheets round trip
+_write_lock = threading.RLock()
+_state = {
+    'snapshot': None,
+    'row_index': {'Income': {}, 'Expenses': {}},
+    # Last sheet row holding data, so appends know where they should land
+    'last_row': {'Income': 1, 'Expenses': 1},
+    'last_probe': 0.0,
+    # Structures computed from a snapshot, keyed by name, valid for derived_version
+    'derived': {},
+    'derived_version': None
+}
+
+
+def get_snapshot():
+    """Return the current ledger snapshot, or None if nothing has been loaded yet"""
+    return _state['snapshot']
+
+def sheet_write_lock():
+    """Lock serializing sheet writes in this process from row lookup to snapshot update
+
+    Without it two sessions could both pass a row check and then write to rows
+    the other one has just moved.
+    """
+    return _write_lock
+
+def row_number_for(sheet_name, row_id):
+    """Sheet row number of the entry row_id, or None if it isn't indexed"""
+    with _lock:
+        return _state['row_index'][sheet_name].get(row_id)
+
+def indexed_ids(sheet_name):
+    """Set of entry IDs that map to exactly one sheet row"""
+    with _lock:
+        return set(_state['row_index'][sheet_name])
+
+def expected_append_row(sheet_name):
+    """Sheet row the next append should land on if nobody else has written"""
+    with _lock:
+        return _state['last_row'][sheet_name] + 1
+
+def record_appended_rows(sheet_name, row_ids, first_row_number):
+    """Index rows that were appended starting at first_row_number"""
+    with _lock:
+        row_index = _state['row_index'][sheet_name]
+        for offset, row_id in enumerate(row_ids):
+            row_index[row_id] = first_row_number + offset
+        last_row = first_row_number + len(row_ids) - 1
+        _state['last_row'][sheet_name] = max(_state['last_row'][sheet_name], last_row)
+
+def record_deleted_row(sheet_name, row_id, row_number):
+    """Drop a deleted entry from the index and move the rows below it up by one"""
+    with _lock:
+        row_index = _state['row_index'][sheet_name]
+        row_index.pop(row_id, None)
+        for key, number in row_index.items():
+            if number > row_number:
+                row_index[key] = number - 1
+        _state['last_row'][sheet_name] -= 1
+
+def _freeze(data):
+    # Work on our own frame so later changes to the caller's object can't leak in
+    return data.copy() if data is not None else None
+
+def publish(income, expense, sheet_versions=None, row_index=None, last_rows=None):
+    """Replace the shared snapshot with freshly loaded ledgers and return it"""
+    with _lock:
+        current = _state['snapshot']
+        version = current.version + 1 if current else 1
+        snapshot = LedgerSnapshot(version, _freeze(income), _freeze(expense), dict(sheet_versions or {}))
+        _state['snapshot'] = snapshot
+        _state['derived'] = {}
+        _state['derived_version'] = snapshot.version
+        if row_index is not None:
+            _state['row_index'] = row_index
+        if last_rows is not None:
+            _state['last_row'] = dict(last_rows)
+        return snapshot
+
+def locate_entry(ledger, row_id):
+    """Return (position, [Sr, Date, Name, Amount]) of the one ledger row with ID row_id
+
+    Raises KeyError unless exactly one row has that ID.
+    """
+    positions = (ledger['Sr'] == row_id).to_numpy().nonzero()[0]
+    if len(positions) != 1:
+        raise KeyError(f"{len(positions)} rows have ID {row_id}")
+    position = int(positions[0])
+    return position, ledger[['Sr', 'Date', 'Name', 'Amount']].iloc[position].tolist()
+
+def replace_ledger(sheet_name, transform, sheet_version=None, update_derived=None):
+    """Publish a new snapshot where one ledger is replaced by transform(old_ledger)
+
+    ``transform`` must return a new DataFrame rather than mutate its argument; the
+    old snapshot stays valid for any session still reading it. Runs under the
+    store lock so concurrent edits from sessions in the same process serialize.
+    ``update_derived(structure, old_ledger)`` returns the structure for the new
+    version, usually through its ``extended``, ``replaced`` or ``removed``
+    method, so cached structures follow the change without a rebuild; the old
+    ones are left untouched. Without it, or if it raises KeyError because the
+    change can't be matched to the cached structures, they are rebuilt on next use.
+    """
+    with _lock:
+        current = _state['snapshot']
+        if current is None:
+            empty = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
+            current = LedgerSnapshot(0, empty, empty, {})
+        key = LEDGER_KEYS[sheet_name]
+        fields = current._asdict()
+        old_ledger = fields[key]
+        fields[key] = transform(old_ledger)
+        fields['version'] = current.version + 1
+        if sheet_version is not None:
+            fields['sheet_versions'] = dict(current.sheet_versions, **{sheet_name: sheet_version})
+        snapshot = LedgerSnapshot(**fields)
+        _state['snapshot'] = snapshot
+        
+        derived = {}
+        if update_derived is not None and _state['derived_version'] == current.version:
+            try:
+                derived = {
+                    name: update_derived(structure, old_ledger)
+                    for name, structure in _state['derived'].items()
+                }
+            except KeyError:
+                derived = {}
+        _state['derived'] = derived
+        _state['derived_version'] = snapshot.version
+        return snapshot
+
+def get_derived(name, build, snapshot=None):
+    """Return the structure called name for snapshot (default: current), building it once per version
+
+    ``build(snapshot)`` must return an object that is never changed afterwards and
+    has ``extended``, ``replaced`` and ``removed`` methods returning new objects,
+    so writes can derive the next version without a rebuild. Builds run outside the store
+    lock so other sessions' writes and probes never wait on them; the result is
+    only cached if the snapshot is still current, so an older snapshot a session
+    is still bound to gets its own uncached build.
+    """
+    with _lock:
+        snapshot = snapshot or _state['snapshot']
+        if snapshot is None:
+            return None
+        if _state['derived_version'] == snapshot.version and name in _state['derived']:
+            return _state['derived'][name]
+    
+    structure = build(snapshot)
+    
+    with _lock:
+        current = _state['snapshot']
+        if current is None or current.version != snapshot.version:
+            return structure
+        if _state['derived_version'] != snapshot.version:
+            _state['derived'] = {}
+            _state['derived_version'] = snapshot.version
+        # Another session may have built it meanwhile; keep one shared copy
+        return _state['derived'].setdefault(name, structure)
+
+def update_sheet_versions(sheet_versions):
+    """Record the latest probe result without changing the ledgers"""
+    with _lock:
+        current = _state['snapshot']
+        if current is not None:
+            _state['snapshot'] = current._replace(sheet_versions=dict(sheet_versions))
+
+def probe_due(interval_seconds):
+    """Return True at most once per interval across all sessions in the process"""
+    with _lock:
+        now = time.monotonic()
+        if now - _state['last_probe'] < interval_seconds:
+            return False
+        _state['last_probe'] = now
+        return True
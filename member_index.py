@@ -0,0 +1,244 @@
+import bisect
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_name(name):
+    """Normalize a free-text member name so spelling variants group together"""
+    return ' '.join(str(name).split()).casefold()
+
+def _parse_amount(amount):
+    value = pd.to_numeric(amount, errors='coerce')
+    return 0.0 if pd.isna(value) else float(value)
+
+def _parse_day(entry_date):
+    value = pd.to_datetime(entry_date, errors='coerce')
+    return None if pd.isna(value) else np.datetime64(value.date(), 'D')
+
+def _year_total(member, year):
+    prefix = f'{year}-'
+    return sum(amount for month, amount in member['months'].items() if month.startswith(prefix))
+
+
+class MemberIndex:
+    """Per-member rollup of union dues keyed by normalized name
+
+    Each member keeps the display name first seen, total paid, payment count,
+    last payment date, per-month totals ('YYYY-MM' -> amount) and the positions
+    of their rows in the income ledger. Built with two group-by aggregations at
+    load; appends, edits and deletes produce a new index via ``extended``,
+    ``replaced`` and ``removed`` without a rebuild.
+    """
+
+    def __init__(self, income_data):
+        self._members = {}
+        # Sorted payment days per member, so removing a payment can recompute last_date and months
+        self._days = {}
+        self._size = len(income_data)
+        if income_data.empty:
+            return
+
+        # Names repeat a lot, normalize each distinct spelling once
+        codes, spellings = pd.factorize(income_data['Name'].astype(str))
+        rows = pd.DataFrame({
+            'Key': pd.Index(spellings).map(normalize_name).to_numpy(dtype=object)[codes],
+            'Name': income_data['Name'].astype(str).str.strip(),
+            'Date': pd.to_datetime(income_data['Date'], errors='coerce'),
+            'Amount': pd.to_numeric(income_data['Amount'], errors='coerce').fillna(0)
+        })
+        rows['Month'] = rows['Date'].dt.to_period('M')
+        rows['Position'] = range(len(rows))
+        rows = rows[rows['Key'] != '']
+
+        # One aggregation per member and one per (member, month), no per-group Python work
+        by_member = rows.groupby('Key', sort=False)
+        totals = by_member.agg(
+            name=('Name', 'first'),
+            total=('Amount', 'sum'),
+            count=('Amount', 'size'),
+            last_date=('Date', 'max')
+        )
+        totals['last_date'] = totals['last_date'].dt.strftime('%Y-%m-%d').fillna('')
+        monthly = rows.dropna(subset=['Date']).groupby(['Key', 'Month'], sort=False)['Amount'].sum()
+        positions = rows['Position'].to_numpy()
+        days = rows['Date'].to_numpy(dtype='datetime64[D]')
+
+        for key, name, total, count, last_date in zip(
+            totals.index, totals['name'], totals['total'].astype(float).tolist(), totals['count'].tolist(), totals['last_date']
+        ):
+            self._members[key] = {
+                'name': name,
+                'total': total,
+                'count': count,
+                'last_date': last_date,
+                'months': {},
+                'positions': []
+            }
+        # Format the few distinct months once instead of every row
+        labels = {month: month.strftime('%Y-%m') for month in monthly.index.unique(level='Month')}
+        for (key, month), amount in zip(monthly.index, monthly.astype(float).tolist()):
+            self._members[key]['months'][labels[month]] = amount
+        for key, indices in by_member.indices.items():
+            self._members[key]['positions'] = positions[indices].tolist()
+            member_days = days[indices]
+            self._days[key] = np.sort(member_days[~np.isnat(member_days)])
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._members
+
+    def get(self, name):
+        """Return the rollup for a member name, or None"""
+        return self._members.get(normalize_name(name))
+
+    def members(self):
+        """Iterate over (key, rollup) pairs"""
+        return self._members.items()
+
+    def _copy(self):
+        index = copy.copy(self)
+        index._members = dict(self._members)
+        index._days = dict(self._days)
+        return index
+
+    def _member_copy(self, key):
+        # The rollup may be shared with older indexes, change a copy
+        member = self._members[key]
+        member = dict(member, months=dict(member['months']), positions=list(member['positions']))
+        self._members[key] = member
+        return member
+
+    def extended(self, sheet_name, rows):
+        """Return a new index with [Sr, Date, Name, Amount] rows folded in; expenses are ignored
+
+        Only the members the rows touch are copied, the index itself is never changed.
+        """
+        index = self._copy()
+        for row in rows:
+            if sheet_name == 'Income':
+                index._size += 1
+                index._insert_entry(index._size - 1, row)
+        return index
+
+    def replaced(self, sheet_name, position, old_row, new_row):
+        """Return a new index with the income row at position changed from old_row to new_row
+
+        Raises KeyError if old_row isn't indexed at position; expenses are ignored.
+        """
+        index = self._copy()
+        if sheet_name == 'Income':
+            index._remove_entry(position, old_row)
+            index._insert_entry(position, new_row)
+        return index
+
+    def removed(self, sheet_name, position, row):
+        """Return a new index without the income row at position; later positions move up by one
+
+        Raises KeyError if row isn't indexed at position; expenses are ignored.
+        """
+        index = self._copy()
+        if sheet_name == 'Income':
+            index._remove_entry(position, row)
+            index._size -= 1
+            for key, member in index._members.items():
+                if member['positions'] and member['positions'][-1] > position:
+                    member = index._member_copy(key)
+                    member['positions'] = [number - 1 if number > position else number for number in member['positions']]
+        return index
+
+    def _insert_entry(self, position, row):
+        _, entry_date, name, amount = row[:4]
+        key = normalize_name(name)
+        if key == '':
+            return
+
+        amount = _parse_amount(amount)
+        day = _parse_day(entry_date)
+
+        if key in self._members:
+            member = self._member_copy(key)
+        else:
+            member = {'name': str(name).strip(), 'total': 0.0, 'count': 0, 'last_date': '', 'months': {}, 'positions': []}
+            self._members[key] = member
+            self._days[key] = np.empty(0, dtype='datetime64[D]')
+
+        member['total'] += amount
+        member['count'] += 1
+        bisect.insort(member['positions'], position)
+        if day is not None:
+            days = self._days[key]
+            self._days[key] = np.insert(days, np.searchsorted(days, day), day)
+            month = str(day)[:7]
+            member['months'][month] = member['months'].get(month, 0.0) + amount
+            member['last_date'] = str(self._days[key][-1])
+
+    def _remove_entry(self, position, row):
+        _, entry_date, name, amount = row[:4]
+        key = normalize_name(name)
+        if key == '':
+            return
+        if key not in self._members or position not in self._members[key]['positions']:
+            raise KeyError(f"Income row {position} is not indexed under {key!r}")
+
+        amount = _parse_amount(amount)
+        day = _parse_day(entry_date)
+        member = self._member_copy(key)
+
+        member['total'] -= amount
+        member['count'] -= 1
+        member['positions'].remove(position)
+        if day is not None:
+            days = self._days[key]
+            days = np.delete(days, np.searchsorted(days, day))
+            self._days[key] = days
+            month = str(day)[:7]
+            month_start = day.astype('datetime64[M]')
+            paid_in_month = np.searchsorted(days, month_start.astype('datetime64[D]')) < np.searchsorted(days, (month_start + 1).astype('datetime64[D]'))
+            if paid_in_month:
+                member['months'][month] -= amount
+            else:
+                del member['months'][month]
+            member['last_date'] = str(days[-1]) if len(days) else ''
+
+        if member['count'] == 0:
+            del self._members[key]
+            del self._days[key]
+
+    def total_for_year(self, name, year):
+        """Total a member paid in the given year"""
+        member = self.get(name)
+        return _year_total(member, year) if member is not None else 0.0
+
+    def search(self, query, limit=50):
+        """Members whose normalized name contains the query"""
+        query = normalize_name(query)
+        matches = []
+        for key, member in self._members.items():
+            if query in key:
+                matches.append(member)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def unpaid_members(self, month):
+        """Members with no payment recorded in month ('YYYY-MM')"""
+        return [member for member in self._members.values() if month not in member['months']]
+
+    def summary_frame(self, members=None, year=None):
+        """Tabulate rollups for display"""
+        members = self._members.values() if members is None else members
+        year = year or pd.Timestamp.now().year
+        return pd.DataFrame([
+            {
+                'Name': member['name'],
+                f'Paid in {year}': _year_total(member, year),
+                'Total Paid': member['total'],
+                'Payments': member['count'],
+                'Last Payment': member['last_date']
+            }
+            for member in members
+        ], columns=['Name', f'Paid in {year}', 'Total Paid', 'Payments', 'Last Payment'])
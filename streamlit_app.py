@@ -3,9 +3,16 @@ import pandas as pd
 from datetime import datetime
 import google_sheets_api as gsa
 import excel_export as excel
+import ledger_store
+import balance
+import member_index
+import duplicate_index
 
 st.set_page_config(page_title="Union Funds Management", layout="wide")
 
+# How often to probe Google Sheets for changes made by other sessions
+PROBE_INTERVAL_SECONDS = 30
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -110,48 +117,65 @@ except Exception as e:
     </div>
     """, unsafe_allow_html=True)
 
-def auto_load_data_on_start():
-    """Automatically load data from Google Sheets when the app starts"""
+def probe_versions_safely():
+    """Probe sheet versions, returning an empty result if the probe fails"""
+    try:
+        return gsa.probe_sheet_versions()
+    except Exception as e:
+        print(f"Error probing sheet versions: {str(e)}")
+        return {}
+
+def read_ledger(sheet_name):
+    """Read one ledger from Google Sheets with the standard columns, raising on API errors"""
+    df = gsa.read_sheet_data(sheet_name, strict=True)
+    if df.empty:
+        return pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
+    
+    # Clean the data and handle NaN values
+    df = df.fillna('')
+    # Ensure proper column order
+    if len(df.columns) >= 4:
+        df.columns = ['Sr', 'Date', 'Name', 'Amount']
+    return df
+
+def bind_session_to_snapshot():
+    """Point this session at the shared ledger snapshot (references only, no copies)"""
+    snapshot = ledger_store.get_snapshot()
+    if snapshot is not None and st.session_state.get('ledger_version') != snapshot.version:
+        st.session_state.income_data = snapshot.income
+        st.session_state.expense_data = snapshot.expense
+        st.session_state.ledger_version = snapshot.version
+        st.session_state.ledger_snapshot = snapshot
+
+def load_data_from_sheets():
+    """Load both ledgers from Google Sheets and share them with every session in the process
+
+    Reads are strict: if any of them fails nothing is published and every
+    session keeps the previous snapshot.
+    """
     try:
-        # Check if data is already loaded in this session
-        if 'data_loaded' not in st.session_state:
-            st.session_state.data_loaded = False
+        # Probe before reading so a change made during the read is caught next time
+        sheet_versions = probe_versions_safely()
+        income_df = read_ledger('Income')
+        expense_df = read_ledger('Expenses')
+        row_index = {}
+        last_rows = {}
+        for sheet_name in ['Income', 'Expenses']:
+            row_index[sheet_name], last_rows[sheet_name] = gsa.read_row_index(sheet_name, strict=True)
         
-        # Load data if not already loaded or if explicitly requested
-        if not st.session_state.data_loaded:
-            income_df = gsa.read_sheet_data('Income')
-            expense_df = gsa.read_sheet_data('Expenses')
-            
-            if not income_df.empty:
-                # Clean the data and handle NaN values
-                income_df = income_df.fillna('')
-                # Ensure proper column order
-                if len(income_df.columns) >= 4:
-                    income_df.columns = ['Sr', 'Date', 'Name', 'Amount']
-                st.session_state.income_data = income_df
-            else:
-                st.session_state.income_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
-            
-            if not expense_df.empty:
-                # Clean the data and handle NaN values
-                expense_df = expense_df.fillna('')
-                # Ensure proper column order
-                if len(expense_df.columns) >= 4:
-                    expense_df.columns = ['Sr', 'Date', 'Name', 'Amount']
-                st.session_state.expense_data = expense_df
-            else:
-                st.session_state.expense_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
-            
-            st.session_state.data_loaded = True
-            return True
+        ledger_store.publish(income_df, expense_df, sheet_versions, row_index, last_rows)
+        bind_session_to_snapshot()
+        return True
     except Exception as e:
-        st.error(f"Error auto-loading data from Google Sheets: {str(e)}")
-        # Initialize empty dataframes if loading fails
-        if 'income_data' not in st.session_state:
-            st.session_state.income_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
-        if 'expense_data' not in st.session_state:
-            st.session_state.expense_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
+        st.error(f"Error loading data from Google Sheets, keeping the previously loaded data: {str(e)}")
         return False
+
+def auto_load_data_on_start():
+    """Load data from Google Sheets once per process, later sessions reuse the shared snapshot"""
+    if ledger_store.get_snapshot() is None:
+        return load_data_from_sheets()
+    bind_session_to_snapshot()
+    return True
     
 # Initialize session state
 if 'income_data' not in st.session_state:
@@ -165,96 +189,266 @@ auto_load_data_on_start()
 
 # Sidebar navigation
 st.sidebar.header("📊 Navigation")
-page = st.sidebar.selectbox("Choose Section", ["Add Income", "Add Expense", "View Data", "Monthly Summary", "Download Data"])
+page = st.sidebar.selectbox("Choose Section", ["Add Income", "Add Expense", "Edit Entry", "View Data", "Member Lookup", "Monthly Summary", "Download Data"])
 
 # Helper functions
-# Updated load_data_from_sheets function (replace the existing one)
-def load_data_from_sheets():
-    """Manual data loading function"""
-    try:
-        income_df = gsa.read_sheet_data('Income')
-        expense_df = gsa.read_sheet_data('Expenses')
-        
-        if not income_df.empty:
-            # Clean the data and handle NaN values
-            income_df = income_df.fillna('')
-            # Ensure proper column order
-            if len(income_df.columns) >= 4:
-                income_df.columns = ['Sr', 'Date', 'Name', 'Amount']
-            st.session_state.income_data = income_df
-        else:
-            st.session_state.income_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
-        
-        if not expense_df.empty:
-            # Clean the data and handle NaN values
-            expense_df = expense_df.fillna('')
-            # Ensure proper column order
-            if len(expense_df.columns) >= 4:
-                expense_df.columns = ['Sr', 'Date', 'Name', 'Amount']
-            st.session_state.expense_data = expense_df
-        else:
-            st.session_state.expense_data = pd.DataFrame(columns=['Sr', 'Date', 'Name', 'Amount'])
-        
-        st.session_state.data_loaded = True
-        return True
-    except Exception as e:
-        st.error(f"Error loading data from Google Sheets: {str(e)}")
-        return False
+def record_own_write(sheet_name, row_delta=0):
+    """Stamp a new sheet version so other processes notice, and return it for our snapshot
 
-def clean_dataframe_for_sheets(df):
-    """Clean DataFrame to remove NaN values and prepare for Google Sheets"""
-    if df.empty:
-        return df
-    
-    # Make a copy to avoid modifying the original
-    clean_df = df.copy()
+    The token is checked before it is replaced: if another writer stamped it
+    since our snapshot, their change is not in our ledger and None is returned
+    so the caller reloads instead of patching the snapshot. None is also
+    returned when the version can't be read or stamped. ``row_delta`` is how
+    many sheet rows our write added (negative for deletes).
+    """
+    snapshot = ledger_store.get_snapshot()
+    known_row_count, known_token = (None, None)
+    if snapshot is not None:
+        known_row_count, known_token = snapshot.sheet_versions.get(sheet_name, (None, None))
     
-    # Replace NaN values with empty strings
-    clean_df = clean_df.fillna('')
+    try:
+        current_token = gsa.read_sheet_version(sheet_name)
+    except Exception as e:
+        print(f"Error reading version for {sheet_name}: {str(e)}")
+        return None
     
-    # Convert all columns to string to avoid type issues
-    for col in clean_df.columns:
-        clean_df[col] = clean_df[col].astype(str)
+    token = gsa.bump_sheet_version(sheet_name)
+    if token is None or current_token != known_token:
+        return None
+    row_count = known_row_count + row_delta if known_row_count is not None else None
+    return (row_count, token)
+
+def refresh_if_changed(force=False):
+    """Reload the ledgers only if the cheap version probe shows another writer changed them
+
+    Probing is rate-limited per process, not per session. Returns True when this
+    session is now behind the shared snapshot and should rerun.
+    """
+    if force or ledger_store.probe_due(PROBE_INTERVAL_SECONDS):
+        current_versions = probe_versions_safely()
+        snapshot = ledger_store.get_snapshot()
+        if current_versions and snapshot is not None:
+            if gsa.versions_changed(snapshot.sheet_versions, current_versions):
+                load_data_from_sheets()
+            else:
+                ledger_store.update_sheet_versions(current_versions)
     
-    return clean_df
+    snapshot = ledger_store.get_snapshot()
+    return snapshot is not None and st.session_state.get('ledger_version') != snapshot.version
+
+def get_running_balance():
+    """Return the running-balance engine for the snapshot this session shows, built once per version"""
+    engine = ledger_store.get_derived(
+        'balance',
+        lambda snapshot: balance.RunningBalance(snapshot.income, snapshot.expense),
+        st.session_state.get('ledger_snapshot')
+    )
+    if engine is None:
+        engine = balance.RunningBalance(st.session_state.income_data, st.session_state.expense_data)
+    return engine
+
+def get_member_index():
+    """Return the per-member dues index for the snapshot this session shows, built once per version"""
+    members = ledger_store.get_derived(
+        'members',
+        lambda snapshot: member_index.MemberIndex(snapshot.income),
+        st.session_state.get('ledger_snapshot')
+    )
+    if members is None:
+        members = member_index.MemberIndex(st.session_state.income_data)
+    return members
+
+def get_duplicate_index():
+    """Return the duplicate-entry hash index for the snapshot this session shows, built once per version"""
+    duplicates = ledger_store.get_derived(
+        'duplicates',
+        lambda snapshot: duplicate_index.DuplicateIndex(snapshot.income, snapshot.expense),
+        st.session_state.get('ledger_snapshot')
+    )
+    if duplicates is None:
+        duplicates = duplicate_index.DuplicateIndex(st.session_state.income_data, st.session_state.expense_data)
+    return duplicates
+
+def add_entries(sheet_name, entries):
+    """Append [Date, Name, Amount] entries to Google Sheets and to the shared ledger
 
-def save_data_to_sheets():
+    Only the new rows are written, in a single append, so concurrent writers never
+    clobber each other. If the rows landed somewhere other than right after the
+    last sheet row we know of, or the version token shows another writer, the
+    ledger is reloaded to pick up their changes.
+    """
     try:
-        # Save income data
-        if not st.session_state.income_data.empty:
-            # Clean the data first
-            clean_income = clean_dataframe_for_sheets(st.session_state.income_data)
-            
-            # Prepare data with headers - convert DataFrame to list format
-            headers = [['Sr', 'Date', 'Name', 'Amount']]
-            data_rows = clean_income.values.tolist()
-            
-            # Combine headers and data
-            all_data = headers + data_rows
-            
-            # Write to sheets using the list format
-            gsa.write_sheet_data('Income', all_data)
-        
-        # Save expense data
-        if not st.session_state.expense_data.empty:
-            # Clean the data first
-            clean_expense = clean_dataframe_for_sheets(st.session_state.expense_data)
+        new_rows = [[gsa.generate_row_id()] + [str(value) for value in entry] for entry in entries]
+        with ledger_store.sheet_write_lock():
+            # Based on the last sheet row, not the filtered ledger, so blank rows don't look like staleness
+            expected_row_number = ledger_store.expected_append_row(sheet_name)
+            row_number, is_stale = gsa.append_rows(sheet_name, new_rows, expected_row_number=expected_row_number)
             
-            # Prepare data with headers - convert DataFrame to list format
-            headers = [['Sr', 'Date', 'Name', 'Amount']]
-            data_rows = clean_expense.values.tolist()
+            # The rows landed either way, so other processes must hear about them even when we reload
+            sheet_version = record_own_write(sheet_name, len(new_rows))
+            if is_stale or sheet_version is None:
+                load_data_from_sheets()
+            else:
+                ledger_store.record_appended_rows(sheet_name, [new_row[0] for new_row in new_rows], row_number)
+                new_rows_df = pd.DataFrame(new_rows, columns=['Sr', 'Date', 'Name', 'Amount'])
+                ledger_store.replace_ledger(
+                    sheet_name,
+                    lambda ledger: pd.concat([ledger, new_rows_df], ignore_index=True),
+                    sheet_version,
+                    lambda structure, ledger: structure.extended(sheet_name, new_rows)
+                )
+                bind_session_to_snapshot()
+        return True
+    except Exception as e:
+        st.error(f"Error saving data to Google Sheets: {str(e)}")
+        return False
+
+def add_entry(sheet_name, entry_date, name, amount):
+    """Append one entry to Google Sheets and to the shared ledger"""
+    return add_entries(sheet_name, [[entry_date.strftime('%Y-%m-%d'), name, amount]])
+
+def _with_entry_updated(row_id, updated_row):
+    def transform(ledger):
+        ledger = ledger.copy()
+        ledger.loc[ledger['Sr'] == row_id, ['Date', 'Name', 'Amount']] = updated_row[1:]
+        return ledger
+    return transform
+
+def _entry_replaced(sheet_name, row_id, updated_row):
+    def update(structure, ledger):
+        position, old_row = ledger_store.locate_entry(ledger, row_id)
+        return structure.replaced(sheet_name, position, old_row, updated_row)
+    return update
+
+def _entry_removed(sheet_name, row_id):
+    def update(structure, ledger):
+        position, old_row = ledger_store.locate_entry(ledger, row_id)
+        return structure.removed(sheet_name, position, old_row)
+    return update
+
+def edit_entry(sheet_name, row_id, entry_date, name, amount):
+    """Update one entry in Google Sheets and in the shared ledger
+
+    The row lookup, sheet write and snapshot update run under the sheet write
+    lock so sessions in this process can't move rows under each other.
+    """
+    try:
+        updated_row = [row_id, entry_date.strftime('%Y-%m-%d'), name, str(amount)]
+        with ledger_store.sheet_write_lock():
+            gsa.update_row(sheet_name, row_id, updated_row, ledger_store.row_number_for(sheet_name, row_id))
             
-            # Combine headers and data
-            all_data = headers + data_rows
+            sheet_version = record_own_write(sheet_name)
+            if sheet_version is None:
+                load_data_from_sheets()
+            else:
+                ledger_store.replace_ledger(
+                    sheet_name,
+                    _with_entry_updated(row_id, updated_row),
+                    sheet_version,
+                    _entry_replaced(sheet_name, row_id, updated_row)
+                )
+                bind_session_to_snapshot()
+        return True
+    except gsa.SheetConflictError as e:
+        st.warning(f"The sheet changed since it was loaded, reloading data: {str(e)}")
+        load_data_from_sheets()
+        return False
+    except Exception as e:
+        st.error(f"Error updating entry in Google Sheets: {str(e)}")
+        return False
+
+def delete_entry(sheet_name, row_id):
+    """Delete one entry from Google Sheets and from the shared ledger, under the sheet write lock"""
+    try:
+        with ledger_store.sheet_write_lock():
+            row_number = ledger_store.row_number_for(sheet_name, row_id)
+            gsa.delete_row(sheet_name, row_id, row_number)
             
-            # Write to sheets using the list format
-            gsa.write_sheet_data('Expenses', all_data)
-        
+            sheet_version = record_own_write(sheet_name, -1)
+            if sheet_version is None:
+                load_data_from_sheets()
+            else:
+                ledger_store.record_deleted_row(sheet_name, row_id, row_number)
+                ledger_store.replace_ledger(
+                    sheet_name,
+                    lambda ledger: ledger[ledger['Sr'] != row_id].reset_index(drop=True),
+                    sheet_version,
+                    _entry_removed(sheet_name, row_id)
+                )
+                bind_session_to_snapshot()
         return True
+    except gsa.SheetConflictError as e:
+        st.warning(f"The sheet changed since it was loaded, reloading data: {str(e)}")
+        load_data_from_sheets()
+        return False
     except Exception as e:
-        st.error(f"Error saving data to Google Sheets: {str(e)}")
+        st.error(f"Error deleting entry from Google Sheets: {str(e)}")
         return False
 
+def confirm_if_duplicate(sheet_name, entry_date, name, amount):
+    """Warn when the entry matches an existing one and return whether it may be added"""
+    if not name or amount <= 0:
+        return True
+    matches = get_duplicate_index().count(sheet_name, entry_date, name, amount)
+    if matches == 0:
+        return True
+    st.warning(f"⚠️ An entry with the same date, name and amount already exists ({matches} found) - this may be a duplicate")
+    # One confirmation per entry and match count, so a tick never carries over to
+    # a different entry or to adding the same one yet again
+    entry = duplicate_index.entry_key(sheet_name, entry_date, name, amount)
+    return st.checkbox("Add anyway", key=f"confirm_duplicate_{'_'.join(map(str, entry))}_{matches}")
+
+def import_problems(import_df):
+    """Series describing why each imported row fails the entry form's checks ('' when valid)"""
+    dates = pd.to_datetime(import_df['Date'], errors='coerce')
+    amounts = pd.to_numeric(import_df['Amount'], errors='coerce')
+    problems = pd.Series('', index=import_df.index)
+    problems = problems.mask(~(amounts > 0), 'Amount must be a number above 0')
+    problems = problems.mask(import_df['Name'].str.strip() == '', 'Name is empty')
+    problems = problems.mask(dates.isna(), 'Date is not a valid date')
+    return problems
+
+def bulk_import(sheet_name, label):
+    """CSV import with invalid rows left out and likely duplicates flagged against the ledger and within the file"""
+    with st.expander(f"📤 Bulk Import {label} from CSV"):
+        uploaded_file = st.file_uploader("CSV file with Date, Name and Amount columns", type="csv", key=f"import_{sheet_name}")
+        if uploaded_file is None:
+            return
+        
+        import_df = pd.read_csv(uploaded_file, dtype=str).fillna('')
+        missing_columns = [column for column in ['Date', 'Name', 'Amount'] if column not in import_df.columns]
+        if missing_columns:
+            st.error(f"Missing columns: {', '.join(missing_columns)}")
+            return
+        
+        import_df = import_df[['Date', 'Name', 'Amount']]
+        problems = import_problems(import_df)
+        valid = problems == ''
+        # Store rows the way the entry form does where they can be parsed
+        parsed_dates = pd.to_datetime(import_df['Date'], errors='coerce')
+        amounts = pd.to_numeric(import_df['Amount'], errors='coerce')
+        import_df = import_df.assign(
+            Date=parsed_dates.dt.strftime('%Y-%m-%d').fillna(import_df['Date']),
+            Name=import_df['Name'].str.strip(),
+            Amount=amounts.astype(float).map(str).where(valid, import_df['Amount'])
+        )
+        
+        # Invalid rows are never imported, so they can't make a later row a duplicate either
+        duplicate_flags = get_duplicate_index().flag_duplicates(sheet_name, import_df[valid]).reindex(import_df.index, fill_value=False)
+        st.dataframe(import_df.assign(**{'Likely Duplicate': duplicate_flags, 'Problem': problems}), use_container_width=True)
+        st.write(f"**{int(duplicate_flags.sum())}** of {len(import_df)} rows look like duplicates")
+        if not valid.all():
+            st.warning(f"{int((~valid).sum())} rows have invalid data and will not be imported")
+        
+        skip_duplicates = st.checkbox("Skip likely duplicates", value=True, key=f"skip_duplicates_{sheet_name}")
+        rows_to_import = import_df[valid & ~duplicate_flags] if skip_duplicates else import_df[valid]
+        
+        if st.button(f"📥 Import {len(rows_to_import)} Rows", key=f"import_button_{sheet_name}"):
+            if rows_to_import.empty:
+                st.info("Nothing to import")
+            elif add_entries(sheet_name, rows_to_import.values.tolist()):
+                st.markdown(f'<div class="success-msg">✅ Imported {len(rows_to_import)} rows into Google Sheets!</div>', unsafe_allow_html=True)
+
 # Load data on app start
 if st.sidebar.button("🔄 Load Data from Google Sheets"):
     if load_data_from_sheets():
@@ -262,6 +456,20 @@ if st.sidebar.button("🔄 Load Data from Google Sheets"):
     else:
         st.sidebar.error("Failed to load data")
 
+# Pick up changes from other writers before rendering, at most one probe per interval per process
+refresh_if_changed()
+bind_session_to_snapshot()
+
+if hasattr(st, 'fragment'):
+    @st.fragment(run_every=PROBE_INTERVAL_SECONDS)
+    def watch_for_changes():
+        """Keep an idle dashboard fresh by probing on a timer and following the shared snapshot"""
+        if refresh_if_changed():
+            st.rerun()
+    
+    with st.sidebar:
+        watch_for_changes()
+
 # Page content based on selection
 if page == "Add Income":
     st.markdown('<div class="section-header"><h2>💵 Add Incoming Amount</h2></div>', unsafe_allow_html=True)
@@ -274,24 +482,21 @@ if page == "Add Income":
     
     with col2:
         income_amount = st.number_input("Amount", min_value=0.0, step=0.01)
+    
+    income_confirmed = confirm_if_duplicate('Income', income_date, income_name, income_amount)
         
     if st.button("➕ Add Income", type="primary"):
-        if income_name and income_amount > 0:
-            new_sr = len(st.session_state.income_data) + 1
-            new_row = pd.DataFrame({
-                'Sr': [str(new_sr)],
-                'Date': [income_date.strftime('%Y-%m-%d')],
-                'Name': [income_name],
-                'Amount': [str(income_amount)]
-            })
-            st.session_state.income_data = pd.concat([st.session_state.income_data, new_row], ignore_index=True)
-            
-            if save_data_to_sheets():
+        if not income_confirmed:
+            st.error("Tick \"Add anyway\" to add a likely duplicate")
+        elif income_name and income_amount > 0:
+            if add_entry('Income', income_date, income_name, income_amount):
                 st.markdown('<div class="success-msg">✅ Income added successfully and saved to Google Sheets!</div>', unsafe_allow_html=True)
             else:
-                st.warning("Income added locally but failed to save to Google Sheets")
+                st.warning("Income could not be saved to Google Sheets")
         else:
             st.error("Please fill in all fields with valid data")
+    
+    bulk_import('Income', 'Income')
 
 elif page == "Add Expense":
     st.markdown('<div class="section-header"><h2>💸 Add Spending</h2></div>', unsafe_allow_html=True)
@@ -304,24 +509,79 @@ elif page == "Add Expense":
     
     with col2:
         expense_amount = st.number_input("Amount", min_value=0.0, step=0.01)
+    
+    expense_confirmed = confirm_if_duplicate('Expenses', expense_date, expense_name, expense_amount)
         
     if st.button("➕ Add Expense", type="primary"):
-        if expense_name and expense_amount > 0:
-            new_sr = len(st.session_state.expense_data) + 1
-            new_row = pd.DataFrame({
-                'Sr': [str(new_sr)],
-                'Date': [expense_date.strftime('%Y-%m-%d')],
-                'Name': [expense_name],
-                'Amount': [str(expense_amount)]
-            })
-            st.session_state.expense_data = pd.concat([st.session_state.expense_data, new_row], ignore_index=True)
-            
-            if save_data_to_sheets():
+        if not expense_confirmed:
+            st.error("Tick \"Add anyway\" to add a likely duplicate")
+        elif expense_name and expense_amount > 0:
+            if add_entry('Expenses', expense_date, expense_name, expense_amount):
                 st.markdown('<div class="success-msg">✅ Expense added successfully and saved to Google Sheets!</div>', unsafe_allow_html=True)
             else:
-                st.warning("Expense added locally but failed to save to Google Sheets")
+                st.warning("Expense could not be saved to Google Sheets")
         else:
             st.error("Please fill in all fields with valid data")
+    
+    bulk_import('Expenses', 'Expense')
+
+elif page == "Edit Entry":
+    st.markdown('<div class="section-header"><h2>✏️ Edit or Delete Entry</h2></div>', unsafe_allow_html=True)
+    
+    ledger_choice = st.radio("Ledger", ["Income", "Expenses"], horizontal=True)
+    state_key = 'income_data' if ledger_choice == "Income" else 'expense_data'
+    ledger = st.session_state[state_key]
+    
+    # Only entries with a unique, indexed ID can be targeted by a single-row update
+    indexed_ids = ledger_store.indexed_ids(ledger_choice)
+    editable = ledger[
+        (ledger['Sr'] != '')
+        & ~ledger['Sr'].duplicated(keep=False)
+        & ledger['Sr'].isin(indexed_ids)
+    ]
+    skipped = len(ledger) - len(editable)
+    
+    if ledger.empty:
+        st.info(f"No {ledger_choice.lower()} records found")
+    elif editable.empty:
+        st.info(f"None of the {len(ledger)} {ledger_choice.lower()} records has a unique ID, so they can't be edited here")
+    else:
+        if skipped:
+            st.caption(f"{skipped} entries without a unique Sr ID are not listed and can only be changed in Google Sheets")
+        entries = editable.set_index('Sr')
+        row_id = st.selectbox(
+            "Entry",
+            entries.index.tolist(),
+            format_func=lambda sr: f"{entries.at[sr, 'Date']} - {entries.at[sr, 'Name']} - Rs {entries.at[sr, 'Amount']}"
+        )
+        entry = entries.loc[row_id]
+        
+        current_date = pd.to_datetime(entry['Date'], errors='coerce')
+        current_amount = pd.to_numeric(entry['Amount'], errors='coerce')
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            edit_date = st.date_input("Date", current_date if not pd.isna(current_date) else datetime.now(), key=f"edit_date_{row_id}")
+            edit_name = st.text_input("Name/Description", entry['Name'], key=f"edit_name_{row_id}")
+        
+        with col2:
+            edit_amount = st.number_input("Amount", min_value=0.0, step=0.01, value=float(current_amount) if not pd.isna(current_amount) else 0.0, key=f"edit_amount_{row_id}")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("💾 Save Changes", type="primary"):
+                if edit_name and edit_amount > 0:
+                    if edit_entry(ledger_choice, row_id, edit_date, edit_name, edit_amount):
+                        st.markdown('<div class="success-msg">✅ Entry updated in Google Sheets!</div>', unsafe_allow_html=True)
+                else:
+                    st.error("Please fill in all fields with valid data")
+        
+        with col2:
+            if st.button("🗑️ Delete Entry"):
+                if delete_entry(ledger_choice, row_id):
+                    st.markdown('<div class="success-msg">✅ Entry deleted from Google Sheets!</div>', unsafe_allow_html=True)
 
 elif page == "View Data":
     st.markdown('<div class="section-header"><h2>📋 View All Data</h2></div>', unsafe_allow_html=True)
@@ -341,27 +601,75 @@ elif page == "View Data":
             st.dataframe(st.session_state.expense_data, use_container_width=True)
         else:
             st.info("No expense records found")
-
-elif page == "Monthly Summary":
-    st.markdown('<div class="section-header"><h2>📊 Monthly Summary</h2></div>', unsafe_allow_html=True)
     
-    # Calculate totals with proper type conversion
-    total_income = 0
-    total_expenses = 0
+    st.subheader("📒 Ledger with Running Balance")
+    ledger_view = get_running_balance().ledger_view()
+    if not ledger_view.empty:
+        st.dataframe(ledger_view, use_container_width=True)
+    else:
+        st.info("No dated records found")
+
+elif page == "Member Lookup":
+    st.markdown('<div class="section-header"><h2>👥 Member Lookup</h2></div>', unsafe_allow_html=True)
     
-    if not st.session_state.income_data.empty:
-        try:
-            total_income = pd.to_numeric(st.session_state.income_data['Amount'], errors='coerce').fillna(0).sum()
-        except:
-            total_income = 0
+    members = get_member_index()
+    current_year = datetime.now().year
     
-    if not st.session_state.expense_data.empty:
-        try:
-            total_expenses = pd.to_numeric(st.session_state.expense_data['Amount'], errors='coerce').fillna(0).sum()
-        except:
-            total_expenses = 0
+    if len(members) == 0:
+        st.info("No income records found")
+    else:
+        search_query = st.text_input("🔍 Search member by name")
+        matches = members.search(search_query)
+        
+        if matches:
+            st.dataframe(members.summary_frame(matches, year=current_year), use_container_width=True)
+            
+            selected_name = st.selectbox("Member", [member['name'] for member in matches])
+            member = members.get(selected_name)
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric(f"💵 Paid in {current_year}", f"Rs {members.total_for_year(selected_name, current_year):,.2f}")
+            
+            with col2:
+                st.metric("💰 Total Paid", f"Rs {member['total']:,.2f}")
+            
+            with col3:
+                st.metric("📅 Last Payment", member['last_date'] or "-")
+            
+            monthly_data = pd.DataFrame(sorted(member['months'].items()), columns=['Month', 'Amount'])
+            st.dataframe(monthly_data, use_container_width=True)
+            
+            if st.button("📋 Download Member Statement"):
+                payments = st.session_state.income_data.iloc[member['positions']]
+                statement = excel.create_member_statement(member, excel.prepare_for_export(payments))
+                st.download_button(
+                    label="💾 Download Statement",
+                    data=statement,
+                    file_name=excel.member_statement_filename(member, datetime.now().strftime('%Y%m%d')),
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+        else:
+            st.info("No members match your search")
+        
+        st.subheader("⏰ Members Not Paid")
+        unpaid_month = st.date_input("Month", datetime.now()).strftime('%Y-%m')
+        unpaid = members.unpaid_members(unpaid_month)
+        if unpaid:
+            st.write(f"**{len(unpaid)} members** have no payment recorded in {unpaid_month}")
+            st.dataframe(members.summary_frame(unpaid, year=current_year), use_container_width=True)
+        else:
+            st.success(f"Every member has paid in {unpaid_month}")
+
+elif page == "Monthly Summary":
+    st.markdown('<div class="section-header"><h2>📊 Monthly Summary</h2></div>', unsafe_allow_html=True)
     
-    net_balance = total_income - total_expenses
+    # Totals come from the cached running-balance engine
+    running_balance = get_running_balance()
+    total_income = running_balance.total_income
+    total_expenses = running_balance.total_expenses
+    net_balance = running_balance.net_balance
     
     # Display metrics
     col1, col2, col3 = st.columns(3)
@@ -375,6 +683,10 @@ elif page == "Monthly Summary":
     with col3:
         st.metric("💰 Net Balance", f"Rs {net_balance:,.2f}", delta=f"{net_balance:,.2f}")
     
+    # Point-in-time balance
+    as_of_date = st.date_input("Balance as of", datetime.now())
+    st.metric("📅 Balance as of Date", f"Rs {running_balance.balance_as_of(as_of_date):,.2f}")
+    
     # Monthly breakdown
     if not st.session_state.income_data.empty or not st.session_state.expense_data.empty:
         st.subheader("📅 Monthly Breakdown")
@@ -428,19 +740,20 @@ elif page == "Download Data":
         st.subheader("📊 Excel Downloads")
         
         # Complete Excel file with all data
+        include_ledger = st.checkbox("Include the running-balance ledger sheet", value=False, help="Writes every entry a second time, so large ledgers take longer to export")
+        include_month_sheets = st.checkbox("Include a sheet per month", value=False, help="Writes every entry a second time, so large ledgers take longer to export")
         if st.button("📋 Download Complete Excel File", type="primary"):
             if not st.session_state.income_data.empty or not st.session_state.expense_data.empty:
                 # Convert data properly for Excel export
-                income_for_excel = st.session_state.income_data.copy()
-                expense_for_excel = st.session_state.expense_data.copy()
-                
-                # Convert Amount columns to numeric
-                if not income_for_excel.empty:
-                    income_for_excel['Amount'] = pd.to_numeric(income_for_excel['Amount'], errors='coerce').fillna(0)
-                if not expense_for_excel.empty:
-                    expense_for_excel['Amount'] = pd.to_numeric(expense_for_excel['Amount'], errors='coerce').fillna(0)
+                income_for_excel = excel.prepare_for_export(st.session_state.income_data)
+                expense_for_excel = excel.prepare_for_export(st.session_state.expense_data)
                 
-                excel_data = excel.create_excel_file(income_for_excel, expense_for_excel)
+                excel_data = excel.create_excel_file(
+                    income_for_excel,
+                    expense_for_excel,
+                    ledger=get_running_balance().ledger_view() if include_ledger else None,
+                    month_sheets=include_month_sheets
+                )
                 st.download_button(
                     label="💾 Download Excel File",
                     data=excel_data,
@@ -482,14 +795,8 @@ elif page == "Download Data":
         if st.button("📊 Download Combined CSV"):
             if not st.session_state.income_data.empty or not st.session_state.expense_data.empty:
                 # Convert data properly for CSV export
-                income_for_csv = st.session_state.income_data.copy()
-                expense_for_csv = st.session_state.expense_data.copy()
-                
-                # Convert Amount columns to numeric
-                if not income_for_csv.empty:
-                    income_for_csv['Amount'] = pd.to_numeric(income_for_csv['Amount'], errors='coerce').fillna(0)
-                if not expense_for_csv.empty:
-                    expense_for_csv['Amount'] = pd.to_numeric(expense_for_csv['Amount'], errors='coerce').fillna(0)
+                income_for_csv = excel.prepare_for_export(st.session_state.income_data)
+                expense_for_csv = excel.prepare_for_export(st.session_state.expense_data)
                 
                 combined_csv = excel.create_combined_csv(income_for_csv, expense_for_csv)
                 st.download_button(
@@ -504,27 +811,13 @@ elif page == "Download Data":
         # Data summary
         st.subheader("📈 Data Summary")
         
-        # Calculate totals safely
-        total_income = 0
-        total_expenses = 0
-        
-        if not st.session_state.income_data.empty:
-            try:
-                total_income = pd.to_numeric(st.session_state.income_data['Amount'], errors='coerce').fillna(0).sum()
-            except:
-                total_income = 0
-        
-        if not st.session_state.expense_data.empty:
-            try:
-                total_expenses = pd.to_numeric(st.session_state.expense_data['Amount'], errors='coerce').fillna(0).sum()
-            except:
-                total_expenses = 0
+        running_balance = get_running_balance()
         
         st.write(f"**Income Records:** {len(st.session_state.income_data)}")
         st.write(f"**Expense Records:** {len(st.session_state.expense_data)}")
-        st.write(f"**Total Income:** Rs {total_income:,.2f}")
-        st.write(f"**Total Expenses:** Rs {total_expenses:,.2f}")
-        st.write(f"**Net Balance:** Rs {total_income - total_expenses:,.2f}")
+        st.write(f"**Total Income:** Rs {running_balance.total_income:,.2f}")
+        st.write(f"**Total Expenses:** Rs {running_balance.total_expenses:,.2f}")
+        st.write(f"**Net Balance:** Rs {running_balance.net_balance:,.2f}")
 
 # Footer
 st.markdown("---")